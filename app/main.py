@@ -1,30 +1,48 @@
 """
-FastAPI Office to LibreOffice Converter - Python Libraries Only
-Converts Microsoft Office files to LibreOffice formats using Python libraries.
+FastAPI Office to LibreOffice Converter
+Converts Microsoft Office files to LibreOffice formats, using Python libraries
+for Office Open XML and the LibreOffice CLI for legacy and other formats.
 """
 
+import asyncio
+import hashlib
+import ipaddress
 import logging
-from io import BytesIO
-from collections import OrderedDict
+import multiprocessing
+import os
+import posixpath
+import shutil
+import signal
+import struct
+import tempfile
+import threading
+import time
+import zipfile
+import zlib
+from collections import deque
 from datetime import datetime
-from typing import Dict
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import BinaryIO, Callable, Dict, List, Optional, Tuple
+from cachetools import TTLCache
 from fastapi import FastAPI, UploadFile, File, HTTPException, Request
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from docx import Document
-from odf.opendocument import OpenDocumentText, OpenDocumentPresentation
-from odf.text import P
-from odf.draw import Page, Frame, TextBox
-import openpyxl
-from pyexcel_ods import save_data
-from pptx import Presentation
+from starlette.background import BackgroundTask
+from starlette.formparsers import MultiPartParser
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from python_calamine import CalamineWorkbook, SheetTypeEnum
+from lxml import etree
+
+from app.middleware import BodySizeLimitMiddleware
+from app.odf_writer import write_odp, write_ods, write_odt
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Rate limiting storage
-rate_limit_storage: Dict[str, list] = {}
 
 # FastAPI application
 app = FastAPI(
@@ -33,6 +51,12 @@ app = FastAPI(
     version="2.1.0",
 )
 
+# Largest accepted upload; request bodies are cut off once they can no longer
+# fit one (with room for the multipart framing around it)
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+MULTIPART_OVERHEAD = 64 * 1024
+app.add_middleware(BodySizeLimitMiddleware, max_body_size=MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD)
+
 # CORS configuration
 app.add_middleware(
     CORSMiddleware,
@@ -45,46 +69,747 @@ app.add_middleware(
 # Rate limiting configuration
 RATE_LIMIT_REQUESTS = 10
 RATE_LIMIT_WINDOW = 60
+RATE_LIMIT_MAX_CLIENTS = 100_000
+
+# Rate limiting storage (monotonic request timestamps per client, oldest first);
+# idle clients expire and the number of tracked clients is capped
+rate_limit_storage: TTLCache = TTLCache(maxsize=RATE_LIMIT_MAX_CLIENTS, ttl=RATE_LIMIT_WINDOW * 2)
+
+# Monotonic time until which a client that hit the limit stays blocked, so
+# flooding clients are rejected without touching their timestamp deque
+blocked_until: TTLCache = TTLCache(maxsize=RATE_LIMIT_MAX_CLIENTS, ttl=RATE_LIMIT_WINDOW)
+
+# Networks of reverse proxies whose X-Forwarded-For / X-Real-IP headers are
+# trusted (comma separated CIDRs; empty trusts none and uses the peer address)
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(cidr.strip()) for cidr in os.environ.get("TRUSTED_PROXIES", "").split(",") if cidr.strip()
+]
+
+# Shared rate limiting across workers through Redis (empty disables it). The
+# script counts requests in a fixed window and returns {allowed, remaining, reset_ms}.
+REDIS_URL = os.environ.get("REDIS_URL", "")
+RATE_LIMIT_SCRIPT = """
+local cost = tonumber(ARGV[3])
+local count = redis.call("INCRBY", KEYS[1], cost)
+if count == cost then
+    redis.call("PEXPIRE", KEYS[1], ARGV[2])
+end
+local reset_ms = redis.call("PTTL", KEYS[1])
+local limit = tonumber(ARGV[1])
+if count > limit then
+    -- Requests that don't fit use none of the remaining quota
+    redis.call("DECRBY", KEYS[1], cost)
+    return {0, limit - count + cost, reset_ms}
+end
+return {1, limit - count, reset_ms}
+"""
+redis_client: Optional[Redis] = None
+rate_limit_script = None
+# After a Redis error, Redis is skipped for this many seconds so an outage
+# doesn't cost every request a socket timeout
+REDIS_BACKOFF = 5.0
+redis_retry_at = 0.0
 
 # Supported formats (Python libraries only)
 SUPPORTED_FORMATS = {
-    "excel": ["xlsx", "xls", "xlsm"],
+    "excel": ["xlsx", "xls", "xlsm", "xlsb"],
     "word": ["docx"],
     "powerpoint": ["pptx"]
 }
 
+# Formats converted through the LibreOffice CLI
+LIBRE_SUPPORTED = {
+    "excel": ["xltx", "xltm"],
+    "word": ["doc", "dotx", "dotm"],
+    "powerpoint": ["ppt", "ppsx", "pps", "potx", "potm"],
+    "publisher": ["pub"],
+    "access": ["mdb", "accdb"],
+}
+
+# Output format per LibreOffice family, flattened to extension -> output extension
+LIBRE_OUTPUT_FORMATS = {
+    "excel": "ods",
+    "word": "odt",
+    "powerpoint": "odp",
+    "publisher": "odt",
+    "access": "ods",
+}
+LIBRE_CONVERSIONS: Dict[str, str] = {
+    ext: LIBRE_OUTPUT_FORMATS[kind] for kind, extensions in LIBRE_SUPPORTED.items() for ext in extensions
+}
+
+# LibreOffice CLI configuration
+SOFFICE_BINARY = os.environ.get("SOFFICE_BINARY", "soffice")
+SOFFICE_TIMEOUT = float(os.environ.get("SOFFICE_TIMEOUT", "60"))
+
+# One-off soffice processes allowed at once (each can take hundreds of MB);
+# further conversions wait for a slot before their timeout starts. Every slot
+# runs with its own user profile: a soffice started on a profile already in
+# use hands its job to the running instance and exits without converting.
+SOFFICE_SLOTS = int(os.environ.get("SOFFICE_SLOTS", str(max(1, (os.cpu_count() or 1) // 2))))
+free_soffice_slots: asyncio.Queue = asyncio.Queue()
+for index in range(SOFFICE_SLOTS):
+    free_soffice_slots.put_nowait(index)
+TMPFS_DIR = "/dev/shm"
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# Uploads up to this size are buffered in memory while received; larger ones
+# spill to a temporary file before being spooled into the work directory
+UPLOAD_SPOOL_MAX_SIZE = int(os.environ.get("UPLOAD_SPOOL_MAX_SIZE", str(5 * 1024 * 1024)))
+MultiPartParser.max_file_size = UPLOAD_SPOOL_MAX_SIZE
+
+# Directory for caching converted files by upload content hash (empty disables caching)
+CACHE_DIR = os.environ.get("CONVERSION_CACHE_DIR", "")
+
+# Converted files are also cached in Redis when REDIS_URL is set (a TTL of 0 disables it);
+# larger outputs are only cached on disk
+CACHE_TTL = int(os.environ.get("CONVERSION_CACHE_TTL", str(6 * 3600)))
+CACHE_MAX_ENTRY_SIZE = int(os.environ.get("CONVERSION_CACHE_MAX_ENTRY_SIZE", str(16 * 1024 * 1024)))
+
+# Persistent soffice listeners driven through unoconv (0 disables the pool)
+SOFFICE_LISTENERS = int(os.environ.get("SOFFICE_LISTENERS", "0"))
+SOFFICE_LISTENER_BASE_PORT = int(os.environ.get("SOFFICE_LISTENER_BASE_PORT", "2002"))
+# Seconds a new listener gets to start accepting connections before it is used anyway
+SOFFICE_LISTENER_START_TIMEOUT = float(os.environ.get("SOFFICE_LISTENER_START_TIMEOUT", "30"))
+UNOCONV_BINARY = os.environ.get("UNOCONV_BINARY", "unoconv")
+soffice_listeners: Dict[int, asyncio.subprocess.Process] = {}
+free_listener_ports: Optional[asyncio.Queue] = None
+
+# Upper bound on the total uncompressed size of zip-based uploads
+MAX_UNCOMPRESSED_SIZE = int(os.environ.get("MAX_UNCOMPRESSED_SIZE", str(2 * MAX_UPLOAD_BYTES)))
+
+# Fixed part of a zip local file header, before the file name and extra field
+LOCAL_HEADER_SIZE = 30
+
+# Most files accepted by one /convert-batch/ request; each file counts
+# against the rate limit, so a batch can never need more than a full window
+MAX_BATCH_FILES = min(20, RATE_LIMIT_REQUESTS)
+
+# Per-thread XML parsers for Office parts (lxml serializes concurrent use of one parser)
+xml_parsers = threading.local()
+
+# WordprocessingML lookups used by the Word converter
+WORD_NAMESPACE = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+WORD_TEXT_TAG = f"{{{WORD_NAMESPACE}}}t"
+WORD_BREAK_TAG = f"{{{WORD_NAMESPACE}}}br"
+WORD_BREAK_TYPE = f"{{{WORD_NAMESPACE}}}type"
+# Text equivalents of the other run content elements, as python-docx reads them;
+# breaks are "\n" for line breaks and "" for page and column breaks
+WORD_RUN_CONTENT_TEXT = {
+    f"{{{WORD_NAMESPACE}}}tab": "\t",
+    f"{{{WORD_NAMESPACE}}}ptab": "\t",
+    f"{{{WORD_NAMESPACE}}}cr": "\n",
+    f"{{{WORD_NAMESPACE}}}noBreakHyphen": "-",
+}
+BODY_PARAGRAPHS_XPATH = etree.XPath("/w:document/w:body/w:p", namespaces={"w": WORD_NAMESPACE})
+PARAGRAPH_RUN_CONTENT_XPATH = etree.XPath(
+    " | ".join(
+        f"./{parent}w:r/w:{tag}"
+        for parent in ("", "w:hyperlink/")
+        for tag in ("t", "tab", "ptab", "br", "cr", "noBreakHyphen")
+    ),
+    namespaces={"w": WORD_NAMESPACE},
+)
+
+# PresentationML lookups used by the PowerPoint converter
+PPTX_NAMESPACES = {
+    "a": "http://schemas.openxmlformats.org/drawingml/2006/main",
+    "p": "http://schemas.openxmlformats.org/presentationml/2006/main",
+    "r": "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
+}
+SLIDE_REL_IDS_XPATH = etree.XPath("/p:presentation/p:sldIdLst/p:sldId/@r:id", namespaces=PPTX_NAMESPACES)
+SLIDE_SHAPES_XPATH = etree.XPath("/p:sld/p:cSld/p:spTree/p:sp", namespaces=PPTX_NAMESPACES)
+SHAPE_PARAGRAPHS_XPATH = etree.XPath("./p:txBody/a:p", namespaces=PPTX_NAMESPACES)
+DRAWING_TEXT_TAG = f"{{{PPTX_NAMESPACES['a']}}}t"
+PARAGRAPH_TEXT_XPATH = etree.XPath("./a:r/a:t | ./a:br | ./a:fld/a:t", namespaces=PPTX_NAMESPACES)
+
+# Worker processes for the CPU-bound Python converters (started at startup);
+# forkserver keeps workers from inheriting the event loop's threads and sockets,
+# and preloading this module lets every worker fork with the imports already done
+PROCESS_POOL_WORKERS = int(os.environ.get("PROCESS_POOL_WORKERS", str(max(1, (os.cpu_count() or 1) - 1))))
+PROCESS_POOL_CONTEXT = multiprocessing.get_context("forkserver")
+PROCESS_POOL_CONTEXT.set_forkserver_preload([__name__])
+PROCESS_POOL = ProcessPoolExecutor(max_workers=PROCESS_POOL_WORKERS, mp_context=PROCESS_POOL_CONTEXT)
+
+# Conversions waiting for or running in the process pool; further ones wait here
+process_pool_slots = asyncio.BoundedSemaphore(2 * PROCESS_POOL_WORKERS)
+
+# Smaller inputs are converted on a thread, where process hand-off would dominate
+PROCESS_POOL_MIN_INPUT_SIZE = int(os.environ.get("PROCESS_POOL_MIN_INPUT_SIZE", str(1024 * 1024)))
+
+# Threads for parsing slides of large decks inside a converter process
+SLIDE_POOL_THREADS = int(os.environ.get("SLIDE_POOL_THREADS", str(os.cpu_count() or 1)))
+SLIDE_POOL = ThreadPoolExecutor(max_workers=SLIDE_POOL_THREADS)
+PARALLEL_SLIDE_THRESHOLD = 8
+
+
+def check_rate_limit(client_ip: str, cost: int = 1) -> bool:
+    """Check if client has exceeded rate limit, counting the request as cost requests."""
+    now = time.monotonic()
+    if blocked_until.get(client_ip, 0.0) > now:
+        return False
+
+    timestamps = rate_limit_storage.get(client_ip)
+    if timestamps is None:
+        timestamps = deque()
 
-def check_rate_limit(client_ip: str) -> bool:
-    """Check if client has exceeded rate limit."""
-    now = datetime.now()
-    
-    if client_ip not in rate_limit_storage:
-        rate_limit_storage[client_ip] = []
-    
     # Remove old requests
-    rate_limit_storage[client_ip] = [
-        timestamp for timestamp in rate_limit_storage[client_ip]
-        if (now - timestamp).total_seconds() < RATE_LIMIT_WINDOW
-    ]
-    
-    if len(rate_limit_storage[client_ip]) >= RATE_LIMIT_REQUESTS:
+    cutoff = now - RATE_LIMIT_WINDOW
+    while timestamps and timestamps[0] <= cutoff:
+        timestamps.popleft()
+
+    if len(timestamps) + cost > RATE_LIMIT_REQUESTS:
+        if len(timestamps) >= RATE_LIMIT_REQUESTS:
+            # Blocked until the oldest request in the window expires
+            blocked_until[client_ip] = timestamps[0] + RATE_LIMIT_WINDOW
         return False
-    
-    rate_limit_storage[client_ip].append(now)
+
+    timestamps.extend([now] * cost)
+    # Re-store to refresh the entry's TTL while the client stays active
+    rate_limit_storage[client_ip] = timestamps
     return True
 
 
+async def acquire_rate_limit(client_ip: str, cost: int = 1) -> Optional[Tuple[int, float]]:
+    """Count a request against the client's limit as cost requests.
+
+    Returns the remaining quota and the seconds until the window resets, or
+    None when the remaining quota is smaller than cost, in which case none of
+    it is used. Uses Redis when configured so all workers share one limit, and
+    falls back to the in-process limiter when Redis is not configured or unreachable.
+    """
+    if (
+        rate_limit_script is not None
+        and redis_available()
+        and blocked_until.get(client_ip, 0.0) <= time.monotonic()
+    ):
+        try:
+            allowed, remaining, reset_ms = await rate_limit_script(
+                keys=[f"rl:{client_ip}"], args=[RATE_LIMIT_REQUESTS, RATE_LIMIT_WINDOW * 1000, cost]
+            )
+        except RedisError as e:
+            redis_failed(f"Redis rate limiting unavailable, using in-process limiter: {e}")
+        else:
+            if not allowed:
+                if remaining == 0:
+                    blocked_until[client_ip] = time.monotonic() + reset_ms / 1000
+                return None
+            return remaining, reset_ms / 1000
+
+    if not check_rate_limit(client_ip, cost):
+        return None
+    timestamps = rate_limit_storage[client_ip]
+    return RATE_LIMIT_REQUESTS - len(timestamps), timestamps[0] + RATE_LIMIT_WINDOW - time.monotonic()
+
+
+def is_trusted_proxy(host: str) -> bool:
+    """Whether a peer address belongs to one of the TRUSTED_PROXIES networks."""
+    try:
+        addr = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(addr in network for network in TRUSTED_PROXIES)
+
+
 def get_client_ip(request: Request) -> str:
-    """Extract client IP address from request."""
+    """Extract client IP address from request.
+
+    Forwarding headers are only honoured when the peer is a trusted proxy;
+    otherwise any client could pick its own rate-limit key.
+    """
+    host = request.client.host if request.client else ""
+    if not TRUSTED_PROXIES or not is_trusted_proxy(host):
+        return host
+
+    # The proxy appends the address it saw; earlier entries are client-supplied
     forwarded_for = request.headers.get("X-Forwarded-For")
     if forwarded_for:
-        return forwarded_for.split(",")[0].strip()
-    
+        return forwarded_for.rsplit(",", 1)[-1].strip()
+
     real_ip = request.headers.get("X-Real-IP")
     if real_ip:
         return real_ip
-    
-    return request.client.host
+
+    return host
+
+
+def make_work_dir() -> str:
+    """Create a per-request scratch directory, on tmpfs when available."""
+    if os.path.isdir(TMPFS_DIR) and os.access(TMPFS_DIR, os.W_OK):
+        return tempfile.mkdtemp(prefix="o2lo-", dir=TMPFS_DIR)
+    return tempfile.mkdtemp(prefix="o2lo-")
+
+
+def save_upload(source: BinaryIO, path: str) -> str:
+    """Copy an uploaded file to disk in 1 MiB chunks and return its content hash."""
+    digest = hashlib.blake2b(digest_size=16)
+    source.seek(0)
+    with open(path, "wb") as f:
+        while chunk := source.read(UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+            f.write(chunk)
+    return digest.hexdigest()
+
+
+def get_cache_path(digest: str, ext: str) -> Optional[str]:
+    """Cache location for a converted upload, or None when caching is disabled."""
+    if not CACHE_DIR:
+        return None
+    return os.path.join(CACHE_DIR, f"{digest}.{ext}")
+
+
+def store_in_cache(output_path: str, cache_path: str) -> None:
+    """Copy a converted file into the cache, publishing it with an atomic rename."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as dst, open(output_path, "rb") as src:
+            shutil.copyfileobj(src, dst, length=UPLOAD_CHUNK_SIZE)
+        os.replace(tmp_path, cache_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def redis_available() -> bool:
+    """Whether Redis may be called, i.e. it has not failed in the last REDIS_BACKOFF seconds."""
+    return time.monotonic() >= redis_retry_at
+
+
+def redis_failed(message: str) -> None:
+    """Log a Redis failure and skip Redis for the next REDIS_BACKOFF seconds."""
+    global redis_retry_at
+    logger.warning(message)
+    redis_retry_at = time.monotonic() + REDIS_BACKOFF
+
+
+def redis_cache_enabled() -> bool:
+    """Whether converted files are cached in Redis."""
+    return redis_client is not None and CACHE_TTL > 0
+
+
+async def load_from_cache(digest: str, ext: str, output_path: str) -> Optional[str]:
+    """Return the path of a cached conversion, or None on a miss.
+
+    CACHE_DIR is checked first, then Redis; a Redis hit is written to output_path.
+    """
+    cache_path = get_cache_path(digest, ext)
+    if cache_path is not None and os.path.isfile(cache_path):
+        return cache_path
+
+    if redis_cache_enabled() and redis_available():
+        try:
+            data = await redis_client.get(f"conv:{digest}:{ext}")
+        except RedisError as e:
+            redis_failed(f"Redis conversion cache unavailable: {e}")
+            return None
+        if data:
+            await asyncio.to_thread(Path(output_path).write_bytes, data)
+            return output_path
+
+    return None
+
+
+async def save_to_cache(digest: str, ext: str, output_path: str, size: int) -> None:
+    """Cache a converted file on disk and in Redis; failures are only logged."""
+    cache_path = get_cache_path(digest, ext)
+    if cache_path is not None:
+        try:
+            await asyncio.to_thread(store_in_cache, output_path, cache_path)
+        except OSError as e:
+            logger.warning(f"Failed to cache conversion on disk: {e}")
+
+    # ODF packages are already deflated, so the blob is stored as is
+    if redis_cache_enabled() and redis_available() and size <= CACHE_MAX_ENTRY_SIZE:
+        try:
+            data = await asyncio.to_thread(Path(output_path).read_bytes)
+            await redis_client.set(f"conv:{digest}:{ext}", data, ex=CACHE_TTL)
+        except RedisError as e:
+            redis_failed(f"Failed to cache conversion in Redis: {e}")
+
+
+def get_xml_parser() -> etree.XMLParser:
+    """Return this thread's XML parser: no entity expansion, no network, no huge trees."""
+    parser = getattr(xml_parsers, "parser", None)
+    if parser is None:
+        parser = etree.XMLParser(resolve_entities=False, no_network=True, huge_tree=False)
+        xml_parsers.parser = parser
+    return parser
+
+
+def inflated_size(raw: BinaryIO, info: zipfile.ZipInfo, limit: int) -> int:
+    """Inflate a deflated archive member and return its real size, stopping past limit.
+
+    Reads the member's data straight from the archive, ignoring the sizes its
+    headers declare.
+    """
+    raw.seek(info.header_offset)
+    header = raw.read(LOCAL_HEADER_SIZE)
+    name_length, extra_length = struct.unpack("<HH", header[26:30])
+    raw.seek(info.header_offset + LOCAL_HEADER_SIZE + name_length + extra_length)
+
+    inflater = zlib.decompressobj(-zlib.MAX_WBITS)
+    size = 0
+    while not inflater.eof:
+        data = raw.read(UPLOAD_CHUNK_SIZE)
+        if not data:
+            break
+        while data and not inflater.eof:
+            size += len(inflater.decompress(data, UPLOAD_CHUNK_SIZE))
+            if size > limit:
+                return size
+            data = inflater.unconsumed_tail
+    return size
+
+
+def check_archive_size(path: str) -> None:
+    """Reject zip archives that would expand beyond MAX_UNCOMPRESSED_SIZE.
+
+    Declared member sizes can be forged and calamine reads past them, so
+    deflated members are inflated to measure what they really expand to.
+    """
+    total = 0
+    with zipfile.ZipFile(path) as zf, open(path, "rb") as raw:
+        for info in zf.infolist():
+            if info.compress_type == zipfile.ZIP_DEFLATED:
+                total += inflated_size(raw, info, MAX_UNCOMPRESSED_SIZE - total)
+            else:
+                total += max(info.file_size, info.compress_size)
+            if total > MAX_UNCOMPRESSED_SIZE:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"Archive expands beyond the limit of {MAX_UNCOMPRESSED_SIZE} bytes",
+                )
+
+
+def write_archive(archive_path: str, members: List[Tuple[str, str]]) -> None:
+    """Bundle (path, archive name) pairs into a zip; ODF outputs are already deflated."""
+    with zipfile.ZipFile(archive_path, "w", zipfile.ZIP_STORED) as zf:
+        for path, arcname in members:
+            zf.write(path, arcname)
+
+
+def listener_connection(port: int) -> str:
+    """UNO connection string for a local soffice listener."""
+    return f"socket,host=127.0.0.1,port={port};urp;"
+
+
+def user_installation(name: str) -> str:
+    """soffice argument selecting a private user profile under the temp directory."""
+    return f"-env:UserInstallation={(Path(tempfile.gettempdir()) / f'o2lo-{name}').as_uri()}"
+
+
+def signal_process_group(proc: asyncio.subprocess.Process, sig: int) -> None:
+    """Signal a process started with start_new_session=True and everything it spawned."""
+    try:
+        os.killpg(proc.pid, sig)
+    except ProcessLookupError:
+        pass
+
+
+async def run_libreoffice(input_paths: List[str], out_ext: str, work_dir: str) -> List[str]:
+    """Convert files with one LibreOffice run and return the output paths.
+
+    Uses a warm listener through unoconv when the listener pool is running,
+    otherwise a one-off soffice process. Input file names must have distinct
+    stems, since outputs are written to work_dir as <stem>.<out_ext>.
+    """
+    output_paths = [
+        os.path.join(work_dir, f"{os.path.splitext(os.path.basename(path))[0]}.{out_ext}")
+        for path in input_paths
+    ]
+    # Every file in the run gets the usual time allowance
+    timeout = SOFFICE_TIMEOUT * len(input_paths)
+
+    port = await free_listener_ports.get() if free_listener_ports is not None else None
+    slot = await free_soffice_slots.get() if port is None else None
+    try:
+        if port is not None:
+            if soffice_listeners[port].returncode is not None:
+                # The listener died (crash or OOM kill); replace it before use
+                logger.warning(f"soffice listener on port {port} exited, restarting it")
+                await spawn_soffice_listener(port)
+            command = [
+                UNOCONV_BINARY, f"--connection={listener_connection(port)}",
+                "-f", out_ext, "-o", work_dir, *input_paths,
+            ]
+        else:
+            command = [
+                SOFFICE_BINARY, user_installation(f"slot-{slot}"), "--headless",
+                "--convert-to", out_ext, "--outdir", work_dir, *input_paths,
+            ]
+
+        # In its own session, so a timeout can kill soffice.bin along with the
+        # soffice wrapper script that launched it
+        proc = await asyncio.create_subprocess_exec(
+            *command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=True,
+        )
+        try:
+            _, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+        except asyncio.TimeoutError:
+            # Don't let a stuck conversion hold a listener or worker forever
+            signal_process_group(proc, signal.SIGKILL)
+            await proc.wait()
+            if port is not None:
+                # The listener is still busy with the stuck document; replace it
+                logger.warning(f"Restarting soffice listener on port {port} after a timeout")
+                listener = soffice_listeners[port]
+                signal_process_group(listener, signal.SIGKILL)
+                await listener.wait()
+                await spawn_soffice_listener(port)
+            logger.error(f"LibreOffice conversion timed out after {timeout} seconds")
+            raise HTTPException(
+                status_code=500,
+                detail=f"LibreOffice conversion timed out after {timeout} seconds",
+            )
+    finally:
+        if port is not None:
+            free_listener_ports.put_nowait(port)
+        else:
+            free_soffice_slots.put_nowait(slot)
+
+    if proc.returncode != 0 or not all(os.path.exists(path) for path in output_paths):
+        error = stderr.decode(errors="replace").strip()
+        logger.error(f"LibreOffice conversion error: {error}")
+        raise HTTPException(status_code=500, detail=f"LibreOffice conversion failed: {error}")
+
+    return output_paths
+
+
+def convert_excel_to_ods(input_path: str, output_path: str) -> None:
+    """Convert an Excel workbook (xlsx, xlsm, xls, xlsb) to ODS, streaming rows from every worksheet."""
+    with CalamineWorkbook.from_path(input_path) as wb:
+        sheets = (
+            (sheet.name, wb.get_sheet_by_name(sheet.name).iter_rows())
+            for sheet in wb.sheets_metadata
+            if sheet.typ == SheetTypeEnum.WorkSheet
+        )
+        with open(output_path, "wb") as output:
+            write_ods(output, sheets)
+
+
+def extract_paragraph_text(paragraph) -> str:
+    """Return a Word paragraph's run text the way python-docx's paragraph.text does."""
+    parts = []
+    for element in PARAGRAPH_RUN_CONTENT_XPATH(paragraph):
+        if element.tag == WORD_TEXT_TAG:
+            parts.append(element.text or "")
+        elif element.tag == WORD_BREAK_TAG:
+            if element.get(WORD_BREAK_TYPE, "textWrapping") == "textWrapping":
+                parts.append("\n")
+        else:
+            parts.append(WORD_RUN_CONTENT_TEXT[element.tag])
+    return "".join(parts)
+
+
+def convert_word_to_odt(input_path: str, output_path: str) -> None:
+    """Convert a Word document to ODT, keeping non-empty paragraphs."""
+    with zipfile.ZipFile(input_path) as zf:
+        document = etree.fromstring(zf.read("word/document.xml"), get_xml_parser())
+
+    texts = (extract_paragraph_text(paragraph) for paragraph in BODY_PARAGRAPHS_XPATH(document))
+
+    with open(output_path, "wb") as output:
+        write_odt(output, (text for text in texts if text.strip()))  # Only non-empty paragraphs
+
+
+def get_slide_paths(zf: zipfile.ZipFile) -> List[str]:
+    """Return the archive paths of a deck's slides in presentation order."""
+    presentation = etree.fromstring(zf.read("ppt/presentation.xml"), get_xml_parser())
+    rels = etree.fromstring(zf.read("ppt/_rels/presentation.xml.rels"), get_xml_parser())
+    targets = {rel.get("Id"): rel.get("Target") for rel in rels}
+    return [
+        posixpath.normpath(posixpath.join("ppt", targets[rel_id]))
+        for rel_id in SLIDE_REL_IDS_XPATH(presentation)
+    ]
+
+
+def extract_drawing_paragraph_text(paragraph) -> str:
+    """Return a DrawingML paragraph's run and field text, with soft breaks as newlines."""
+    return "".join(
+        (element.text or "") if element.tag == DRAWING_TEXT_TAG else "\n"
+        for element in PARAGRAPH_TEXT_XPATH(paragraph)
+    )
+
+
+def extract_slide_texts(slide_xml: bytes) -> List[str]:
+    """Return the stripped text of every top-level text shape on a slide."""
+    slide = etree.fromstring(slide_xml, get_xml_parser())
+    texts = []
+    for shape in SLIDE_SHAPES_XPATH(slide):
+        text = "\n".join(
+            extract_drawing_paragraph_text(paragraph)
+            for paragraph in SHAPE_PARAGRAPHS_XPATH(shape)
+        ).strip()
+        if text:
+            texts.append(text)
+    return texts
+
+
+def convert_powerpoint_to_odp(input_path: str, output_path: str) -> None:
+    """Convert a PowerPoint deck to ODP, one text frame per text shape."""
+    with zipfile.ZipFile(input_path) as zf:
+        slide_paths = get_slide_paths(zf)
+        logger.info(f"Processing {len(slide_paths)} slides")
+
+        def read_slide_texts(path: str) -> List[str]:
+            return extract_slide_texts(zf.read(path))
+
+        # Large decks are read from the archive and parsed in parallel (lxml
+        # releases the GIL while parsing); pages are written as slides come in
+        if len(slide_paths) >= PARALLEL_SLIDE_THRESHOLD:
+            slide_texts = SLIDE_POOL.map(read_slide_texts, slide_paths)
+        else:
+            slide_texts = map(read_slide_texts, slide_paths)
+
+        with open(output_path, "wb") as output:
+            write_odp(output, slide_texts)
+
+
+# Extension -> converter for the formats handled by the Python libraries
+CONVERTERS: Dict[str, Callable[[str, str], None]] = {
+    **{ext: convert_excel_to_ods for ext in SUPPORTED_FORMATS["excel"]},
+    **{ext: convert_word_to_odt for ext in SUPPORTED_FORMATS["word"]},
+    **{ext: convert_powerpoint_to_odp for ext in SUPPORTED_FORMATS["powerpoint"]},
+}
+
+# Extension -> output extension for every supported format; anything not in
+# CONVERTERS goes through LibreOffice
+OUTPUT_FORMATS: Dict[str, str] = {
+    **LIBRE_CONVERSIONS,
+    **{ext: LIBRE_OUTPUT_FORMATS[kind] for kind, extensions in SUPPORTED_FORMATS.items() for ext in extensions},
+}
+
+
+def replace_process_pool(broken: ProcessPoolExecutor) -> None:
+    """Swap a broken process pool for a fresh one (once, however many jobs saw it break)."""
+    global PROCESS_POOL
+    if PROCESS_POOL is broken:
+        PROCESS_POOL = ProcessPoolExecutor(max_workers=PROCESS_POOL_WORKERS, mp_context=PROCESS_POOL_CONTEXT)
+        broken.shutdown(wait=False, cancel_futures=True)
+
+
+async def run_converter(func: Callable[[str, str], None], input_path: str, output_path: str) -> None:
+    """Run a blocking converter off the event loop.
+
+    Large inputs go to the process pool so conversions don't share one GIL.
+    If a worker dies the pool is replaced and the job retried once on the new
+    pool; conversions never fall back into the API process, since the input
+    itself may be what killed the worker.
+    """
+    if os.path.getsize(input_path) < PROCESS_POOL_MIN_INPUT_SIZE:
+        await asyncio.to_thread(func, input_path, output_path)
+        return
+
+    async with process_pool_slots:
+        for _ in range(2):
+            pool = PROCESS_POOL
+            try:
+                await asyncio.get_running_loop().run_in_executor(pool, func, input_path, output_path)
+                return
+            except BrokenProcessPool:
+                logger.warning("Converter process pool broke; restarting it")
+                replace_process_pool(pool)
+
+    raise HTTPException(status_code=500, detail="Conversion failed: the converter process crashed")
+
+
+def warm_up_worker() -> None:
+    """Create this process's XML parser ahead of its first conversion."""
+    get_xml_parser()
+
+
+@app.on_event("startup")
+async def warm_up_process_pool():
+    """Start all converter workers now rather than on the first large upload."""
+    loop = asyncio.get_running_loop()
+    # Submitted back to back, each job finds no idle worker and spawns one
+    await asyncio.gather(
+        *(loop.run_in_executor(PROCESS_POOL, warm_up_worker) for _ in range(PROCESS_POOL_WORKERS))
+    )
+
+
+@app.on_event("shutdown")
+async def shutdown_process_pool():
+    """Stop converter worker processes."""
+    PROCESS_POOL.shutdown(wait=False, cancel_futures=True)
+
+
+async def spawn_soffice_listener(port: int) -> None:
+    """Start a headless soffice process and wait for it to accept UNO connections on a port."""
+    # Each listener needs its own profile, or soffice hands requests to one instance
+    soffice_listeners[port] = await asyncio.create_subprocess_exec(
+        SOFFICE_BINARY, "--headless", "--invisible", "--nologo", "--norestore",
+        user_installation(f"profile-{port}"),
+        f"--accept={listener_connection(port)}",
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    await wait_for_listener(port)
+
+
+async def wait_for_listener(port: int) -> None:
+    """Wait until the listener on a port accepts connections, up to the start timeout."""
+    listener = soffice_listeners[port]
+    deadline = time.monotonic() + SOFFICE_LISTENER_START_TIMEOUT
+    while listener.returncode is None and time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+        except OSError:
+            await asyncio.sleep(0.1)
+            continue
+        writer.close()
+        await writer.wait_closed()
+        return
+    logger.warning(f"soffice listener on port {port} is not accepting connections")
+
+
+@app.on_event("startup")
+async def connect_redis():
+    """Connect to Redis for shared rate limiting when REDIS_URL is set."""
+    global redis_client, rate_limit_script
+    if not REDIS_URL:
+        return
+    redis_client = Redis.from_url(REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5)
+    rate_limit_script = redis_client.register_script(RATE_LIMIT_SCRIPT)
+
+
+@app.on_event("shutdown")
+async def close_redis():
+    """Close the Redis connection pool."""
+    if redis_client is not None:
+        await redis_client.aclose()
+
+
+@app.on_event("startup")
+async def start_soffice_listeners():
+    """Launch persistent headless soffice listeners so conversions skip cold start."""
+    global free_listener_ports
+    if SOFFICE_LISTENERS <= 0:
+        return
+
+    free_listener_ports = asyncio.Queue()
+    ports = [SOFFICE_LISTENER_BASE_PORT + index for index in range(SOFFICE_LISTENERS)]
+    await asyncio.gather(*(spawn_soffice_listener(port) for port in ports))
+    for port in ports:
+        free_listener_ports.put_nowait(port)
+
+    logger.info(f"Started {SOFFICE_LISTENERS} soffice listeners from port {SOFFICE_LISTENER_BASE_PORT}")
+
+
+@app.on_event("shutdown")
+async def stop_soffice_listeners():
+    """Terminate the soffice listeners."""
+    for proc in soffice_listeners.values():
+        if proc.returncode is None:
+            signal_process_group(proc, signal.SIGTERM)
+    for proc in soffice_listeners.values():
+        await proc.wait()
+    soffice_listeners.clear()
 
 
 @app.get("/")
@@ -94,8 +819,10 @@ async def root():
         "message": "Office to LibreOffice Converter API",
         "version": "2.1.0",
         "supported_formats": SUPPORTED_FORMATS,
+        "libreoffice_formats": LIBRE_SUPPORTED,
         "endpoints": {
             "convert": "/convert/",
+            "convert_batch": "/convert-batch/",
             "docs": "/docs"
         }
     }
@@ -120,7 +847,8 @@ async def convert(request: Request, file: UploadFile = File(...)):
     
     # Rate limiting
     client_ip = get_client_ip(request)
-    if not check_rate_limit(client_ip):
+    rate_limit = await acquire_rate_limit(client_ip)
+    if rate_limit is None:
         logger.warning(f"Rate limit exceeded for IP: {client_ip}")
         raise HTTPException(
             status_code=429, 
@@ -128,6 +856,7 @@ async def convert(request: Request, file: UploadFile = File(...)):
             headers={"Retry-After": str(RATE_LIMIT_WINDOW)}
         )
     
+    rate_limit_remaining, rate_limit_reset = rate_limit
     logger.info(f"Processing conversion request from IP: {client_ip}")
     
     # Validate file
@@ -137,120 +866,205 @@ async def convert(request: Request, file: UploadFile = File(...)):
     name, ext = file.filename.rsplit(".", 1)
     ext = ext.lower()
 
-    # Read file content
-    try:
-        contents = await file.read()
-        if not contents:
-            raise HTTPException(status_code=400, detail="Uploaded file is empty")
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Failed to read file: {str(e)}")
+    out_ext = OUTPUT_FORMATS.get(ext)
+    if out_ext is None:
+        return JSONResponse(status_code=400, content={"error": "Unsupported file format"})
+
+    # The multipart parser has already spooled the upload and recorded its size
+    if file.size == 0:
+        raise HTTPException(status_code=400, detail="Uploaded file is empty")
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=413, detail=f"File too large. Maximum upload size is {MAX_UPLOAD_BYTES} bytes."
+        )
 
-    output_stream = BytesIO()
+    # The upload and the converted output live in a per-request work
+    # directory, so neither is ever held in memory as a whole
+    work_dir = make_work_dir()
+    input_path = os.path.join(work_dir, f"input.{ext}")
+    result_path = None
     filename = ""
 
     try:
-        if ext in SUPPORTED_FORMATS["excel"]:
-            # Convert Excel to ODS
-            logger.info(f"Converting Excel file {file.filename}")
-            
-            wb = openpyxl.load_workbook(BytesIO(contents))
-            sheet = wb.active
-            
-            data = OrderedDict()
-            data["Sheet1"] = [list(row) for row in sheet.iter_rows(values_only=True)]
-            
-            save_data(output_stream, data)
-            filename = f"{name}.ods"
-
-        elif ext in SUPPORTED_FORMATS["word"]:
-            # Convert Word to ODT
-            logger.info(f"Converting Word file {file.filename}")
-            
-            doc = Document(BytesIO(contents))
-            odt = OpenDocumentText()
-            
-            for para in doc.paragraphs:
-                if para.text.strip():  # Only add non-empty paragraphs
-                    odt.text.addElement(P(text=para.text))
-            
-            odt.save(output_stream)
-            filename = f"{name}.odt"
-
-        elif ext in SUPPORTED_FORMATS["powerpoint"]:
-            # Convert PowerPoint to ODP
-            logger.info(f"Converting PowerPoint file {file.filename}")
-            
-            try:
-                prs = Presentation(BytesIO(contents))
-                odp = OpenDocumentPresentation()
-                
-                logger.info(f"Processing {len(prs.slides)} slides")
-                
-                for slide_idx, slide in enumerate(prs.slides):
-                    page = Page()
-                    
-                    # Extract text from shapes
-                    for shape in slide.shapes:
-                        if hasattr(shape, "has_text_frame") and shape.has_text_frame:
-                            try:
-                                text = shape.text.strip() if shape.text else ""
-                                if text:
-                                    frame = Frame()
-                                    textbox = TextBox()
-                                    textbox.addElement(P(text=text))
-                                    frame.addElement(textbox)
-                                    page.addElement(frame)
-                            except Exception:
-                                continue
-                    
-                    odp.presentation.addElement(page)
-                
-                odp.save(output_stream)
-                filename = f"{name}.odp"
-                
-            except Exception as e:
-                logger.error(f"PowerPoint conversion error: {e}")
-                raise HTTPException(status_code=500, detail=f"PowerPoint conversion failed: {str(e)}")
+        # Spool the upload to disk
+        try:
+            digest = await asyncio.to_thread(save_upload, file.file, input_path)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Failed to read file: {str(e)}")
+
+        # Office Open XML formats are zip archives; guard against zip bombs
+        if zipfile.is_zipfile(input_path):
+            await asyncio.to_thread(check_archive_size, input_path)
+
+        caching = bool(CACHE_DIR) or redis_cache_enabled()
+        cached_path = None
+        if caching:
+            cached_path = await load_from_cache(digest, ext, os.path.join(work_dir, f"output.{out_ext}"))
+        cache_hit = cached_path is not None
+
+        if cache_hit:
+            # The same upload was converted before
+            logger.info(f"Serving cached conversion of {file.filename}")
+            output_path = cached_path
+
+        elif ext in CONVERTERS:
+            # Convert with the Python libraries
+            logger.info(f"Converting {file.filename} to {out_ext.upper()}")
+            output_path = os.path.join(work_dir, f"output.{out_ext}")
+            await run_converter(CONVERTERS[ext], input_path, output_path)
 
         else:
-            # Unsupported format
-            supported_list = []
-            for extensions in SUPPORTED_FORMATS.items():
-                supported_list.extend(extensions)
-            
-            return JSONResponse(
-                status_code=400, 
-                content={
-                    "error": f"Unsupported file format: {ext}",
-                    "supported_formats": supported_list
-                }
-            )
+            # Convert through the LibreOffice CLI
+            logger.info(f"Converting {file.filename} with LibreOffice CLI")
+            output_path = (await run_libreoffice([input_path], out_ext, work_dir))[0]
+
+        filename = f"{name}.{out_ext}"
+
+        # Validate output; the stat result is reused by the response
+        output_stat = os.stat(output_path)
+        content_length = output_stat.st_size
+        if content_length == 0:
+            raise HTTPException(status_code=500, detail="Converted file is empty")
+
+        if caching and not cache_hit:
+            await save_to_cache(digest, ext, output_path, content_length)
+
+        result_path = output_path
 
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Conversion failed for {file.filename}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Conversion failed: {str(e)}")
-
-    # Validate output
-    output_stream.seek(0, 2)
-    content_length = output_stream.tell()
-    output_stream.seek(0)
-    
-    if content_length == 0:
-        raise HTTPException(status_code=500, detail="Converted file is empty")
+    finally:
+        # Once the response is built, its background task removes the work directory
+        if result_path is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
 
     # Response headers
     headers = {
         "Content-Disposition": f"attachment; filename={filename}",
         "X-Conversion-Status": "success",
-        "X-Rate-Limit-Remaining": str(RATE_LIMIT_REQUESTS - len(rate_limit_storage.get(client_ip, []))),
+        "X-Rate-Limit-Remaining": str(rate_limit_remaining),
+        "X-Rate-Limit-Reset": str(int(time.time() + rate_limit_reset)),
     }
+    if caching:
+        headers["X-Cache"] = "HIT" if cache_hit else "MISS"
 
     logger.info(f"Successfully converted {file.filename} to {filename} ({content_length} bytes)")
 
-    return StreamingResponse(
-        output_stream,
+    return FileResponse(
+        result_path,
         media_type="application/octet-stream",
-        headers=headers
-    )
\ No newline at end of file
+        headers=headers,
+        stat_result=output_stat,
+        background=BackgroundTask(shutil.rmtree, work_dir, ignore_errors=True),
+    )
+
+
+@app.post("/convert-batch/")
+async def convert_batch(request: Request, files: List[UploadFile] = File(...)):
+    """Convert several Office files and return the results as one zip archive.
+
+    Files that go through LibreOffice are converted with a single run per
+    output format, so soffice start-up is paid once for the whole batch.
+    """
+    if len(files) > MAX_BATCH_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_FILES} files per batch")
+
+    # Every file in the batch counts against the rate limit; a batch that
+    # doesn't fit in the remaining quota is rejected without using any of it
+    client_ip = get_client_ip(request)
+    rate_limit = await acquire_rate_limit(client_ip, cost=len(files))
+    if rate_limit is None:
+        logger.warning(f"Rate limit exceeded for IP: {client_ip}")
+        raise HTTPException(
+            status_code=429,
+            detail=f"Rate limit exceeded. Maximum {RATE_LIMIT_REQUESTS} requests per {RATE_LIMIT_WINDOW} seconds.",
+            headers={"Retry-After": str(RATE_LIMIT_WINDOW)}
+        )
+    rate_limit_remaining, rate_limit_reset = rate_limit
+
+    logger.info(f"Processing batch of {len(files)} files from IP: {client_ip}")
+
+    # Validate every file before any work is done
+    for file in files:
+        if not file.filename or "." not in file.filename:
+            raise HTTPException(status_code=400, detail="File must have an extension")
+        if file.filename.rsplit(".", 1)[1].lower() not in OUTPUT_FORMATS:
+            raise HTTPException(status_code=400, detail=f"Unsupported file format: {file.filename}")
+        if file.size == 0:
+            raise HTTPException(status_code=400, detail=f"Uploaded file is empty: {file.filename}")
+
+    work_dir = make_work_dir()
+    result_path = None
+
+    try:
+        jobs = []
+        members = []
+        arcnames = set()
+        libre_inputs: Dict[str, List[str]] = {}
+        for index, file in enumerate(files):
+            name, ext = file.filename.rsplit(".", 1)
+            ext = ext.lower()
+            out_ext = OUTPUT_FORMATS[ext]
+
+            # Indexed names keep stems distinct for the shared LibreOffice run
+            input_path = os.path.join(work_dir, f"file{index}.{ext}")
+            output_path = os.path.join(work_dir, f"file{index}.{out_ext}")
+            try:
+                await asyncio.to_thread(save_upload, file.file, input_path)
+            except Exception as e:
+                raise HTTPException(status_code=400, detail=f"Failed to read file {file.filename}: {str(e)}")
+            if zipfile.is_zipfile(input_path):
+                await asyncio.to_thread(check_archive_size, input_path)
+
+            if ext in CONVERTERS:
+                jobs.append(run_converter(CONVERTERS[ext], input_path, output_path))
+            else:
+                libre_inputs.setdefault(out_ext, []).append(input_path)
+
+            # Repeated file names get a numeric suffix inside the archive
+            arcname = f"{name}.{out_ext}"
+            if arcname in arcnames:
+                arcname = f"{name} ({index}).{out_ext}"
+            arcnames.add(arcname)
+            members.append((output_path, arcname))
+
+        jobs.extend(run_libreoffice(paths, out_ext, work_dir) for out_ext, paths in libre_inputs.items())
+
+        # Wait for every job before raising, so none is still writing into the work directory
+        results = await asyncio.gather(*jobs, return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+        archive_path = os.path.join(work_dir, "converted.zip")
+        await asyncio.to_thread(write_archive, archive_path, members)
+        result_path = archive_path
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Batch conversion failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Conversion failed: {str(e)}")
+    finally:
+        # Once the response is built, its background task removes the work directory
+        if result_path is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    headers = {
+        "Content-Disposition": "attachment; filename=converted.zip",
+        "X-Conversion-Status": "success",
+        "X-Rate-Limit-Remaining": str(rate_limit_remaining),
+        "X-Rate-Limit-Reset": str(int(time.time() + rate_limit_reset)),
+    }
+
+    logger.info(f"Successfully converted batch of {len(files)} files")
+
+    return FileResponse(
+        result_path,
+        media_type="application/zip",
+        headers=headers,
+        background=BackgroundTask(shutil.rmtree, work_dir, ignore_errors=True),
+    )
@@ -0,0 +1,73 @@
+"""
+ASGI middleware for the converter API.
+"""
+
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class BodyTooLarge(Exception):
+    """Raised from receive() once a request body passes the size limit."""
+
+
+class BodySizeLimitMiddleware:
+    """Reject request bodies larger than max_body_size with 413.
+
+    A declared Content-Length is checked before any of the body is read;
+    bodies without one are counted as they stream in and cut off once over
+    the limit, so the server never buffers bytes it is going to discard.
+    """
+
+    def __init__(self, app: ASGIApp, max_body_size: int) -> None:
+        self.app = app
+        self.max_body_size = max_body_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        content_length = Headers(scope=scope).get("content-length", "")
+        if content_length.isdigit() and int(content_length) > self.max_body_size:
+            await self.reject(scope, receive, send)
+            return
+
+        received = 0
+        too_large = False
+        response_started = False
+
+        async def limited_receive() -> Message:
+            nonlocal received, too_large
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_size:
+                    too_large = True
+                    raise BodyTooLarge()
+            return message
+
+        async def guarded_send(message: Message) -> None:
+            nonlocal response_started
+            # Whatever the app made of the aborted body is replaced by the 413
+            if too_large:
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not too_large:
+                raise
+
+        if too_large and not response_started:
+            await self.reject(scope, receive, send)
+
+    async def reject(self, scope: Scope, receive: Receive, send: Send) -> None:
+        response = JSONResponse(
+            status_code=413,
+            content={"detail": f"Request body too large. Maximum size is {self.max_body_size} bytes."},
+        )
+        await response(scope, receive, send)
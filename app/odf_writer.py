@@ -0,0 +1,224 @@
+"""
+Minimal OpenDocument package writers.
+Emit ODF XML directly as bytes instead of building an odfpy element tree.
+"""
+
+import datetime
+import numbers
+import zipfile
+from typing import Any, BinaryIO, Iterable, List, Sequence, Tuple
+
+ODP_MIMETYPE = "application/vnd.oasis.opendocument.presentation"
+ODS_MIMETYPE = "application/vnd.oasis.opendocument.spreadsheet"
+ODT_MIMETYPE = "application/vnd.oasis.opendocument.text"
+
+NAMESPACES = (
+    b'xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0" '
+    b'xmlns:style="urn:oasis:names:tc:opendocument:xmlns:style:1.0" '
+    b'xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0" '
+    b'xmlns:table="urn:oasis:names:tc:opendocument:xmlns:table:1.0" '
+    b'xmlns:draw="urn:oasis:names:tc:opendocument:xmlns:drawing:1.0" '
+    b'xmlns:presentation="urn:oasis:names:tc:opendocument:xmlns:presentation:1.0" '
+    b'office:version="1.2"'
+)
+
+MANIFEST_TEMPLATE = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<manifest:manifest xmlns:manifest="urn:oasis:names:tc:opendocument:xmlns:manifest:1.0" manifest:version="1.2">'
+    '<manifest:file-entry manifest:full-path="/" manifest:media-type="{mimetype}"/>'
+    '<manifest:file-entry manifest:full-path="content.xml" manifest:media-type="text/xml"/>'
+    '<manifest:file-entry manifest:full-path="styles.xml" manifest:media-type="text/xml"/>'
+    '</manifest:manifest>'
+)
+
+# Presentation pages must reference a master page, defined in styles.xml
+ODP_STYLES = (
+    b'<?xml version="1.0" encoding="UTF-8"?>\n'
+    b'<office:document-styles ' + NAMESPACES + b'>'
+    b'<office:automatic-styles><style:page-layout style:name="PM1"/></office:automatic-styles>'
+    b'<office:master-styles><style:master-page style:name="Default" style:page-layout-name="PM1"/></office:master-styles>'
+    b'</office:document-styles>'
+)
+
+# Spreadsheets and text documents need no styles of their own
+EMPTY_STYLES = (
+    b'<?xml version="1.0" encoding="UTF-8"?>\n'
+    b'<office:document-styles ' + NAMESPACES + b'/>'
+)
+
+ODS_CONTENT_START = (
+    b'<?xml version="1.0" encoding="UTF-8"?>\n'
+    b'<office:document-content ' + NAMESPACES + b'>'
+    b'<office:body><office:spreadsheet>'
+)
+ODS_CONTENT_END = b'</office:spreadsheet></office:body></office:document-content>'
+
+TABLE_START = b'<table:table table:name="%s">'
+TABLE_END = b'</table:table>'
+ROW_START = b'<table:table-row>'
+ROW_END = b'</table:table-row>'
+EMPTY_CELL = b'<table:table-cell/>'
+CELL_END = b'</table:table-cell>'
+PARAGRAPH_START = b'<text:p>'
+PARAGRAPH_END = b'</text:p>'
+STRING_CELL_START = b'<table:table-cell office:value-type="string">'
+FLOAT_CELL = b'<table:table-cell office:value-type="float" office:value="%s"><text:p>%s</text:p></table:table-cell>'
+DATE_CELL = b'<table:table-cell office:value-type="date" office:date-value="%s"><text:p>%s</text:p></table:table-cell>'
+TIME_CELL = b'<table:table-cell office:value-type="time" office:time-value="%s"><text:p>%s</text:p></table:table-cell>'
+TRUE_CELL = b'<table:table-cell office:value-type="boolean" office:boolean-value="true"><text:p>TRUE</text:p></table:table-cell>'
+FALSE_CELL = b'<table:table-cell office:value-type="boolean" office:boolean-value="false"><text:p>FALSE</text:p></table:table-cell>'
+
+# Content is flushed to the zip stream in chunks of this size
+FLUSH_SIZE = 64 * 1024
+
+ODT_CONTENT_START = (
+    b'<?xml version="1.0" encoding="UTF-8"?>\n'
+    b'<office:document-content ' + NAMESPACES + b'>'
+    b'<office:body><office:text>'
+)
+ODT_CONTENT_END = b'</office:text></office:body></office:document-content>'
+
+TAB = b'<text:tab/>'
+LINE_BREAK = b'<text:line-break/>'
+
+ODP_CONTENT_START = (
+    b'<?xml version="1.0" encoding="UTF-8"?>\n'
+    b'<office:document-content ' + NAMESPACES + b'>'
+    b'<office:body><office:presentation>'
+)
+ODP_CONTENT_END = b'</office:presentation></office:body></office:document-content>'
+
+PAGE_START = b'<draw:page draw:name="page%d" draw:master-page-name="Default">'
+PAGE_END = b'</draw:page>'
+FRAME_START = b'<draw:frame><draw:text-box>'
+FRAME_END = b'</draw:text-box></draw:frame>'
+
+
+def open_package(output: BinaryIO, mimetype: str, styles: bytes) -> zipfile.ZipFile:
+    """Start an ODF zip package; the mimetype entry must come first, uncompressed."""
+    zf = zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED)
+    zf.writestr(zipfile.ZipInfo("mimetype"), mimetype, compress_type=zipfile.ZIP_STORED)
+    zf.writestr("META-INF/manifest.xml", MANIFEST_TEMPLATE.format(mimetype=mimetype))
+    zf.writestr("styles.xml", styles)
+    return zf
+
+
+def escape_text(text: str) -> str:
+    """Escape XML text content; strings without markup characters are returned as is."""
+    if "&" in text:
+        text = text.replace("&", "&amp;")
+    if "<" in text:
+        text = text.replace("<", "&lt;")
+    if ">" in text:
+        text = text.replace(">", "&gt;")
+    return text
+
+
+def escape_attribute(value: str) -> str:
+    """Escape a string for use inside a double-quoted XML attribute."""
+    return escape_text(value).replace('"', "&quot;")
+
+
+def write_odp(output: BinaryIO, slide_texts: Iterable[List[str]]) -> None:
+    """Write a presentation with one page per slide and one frame per text, streaming content.xml."""
+    with open_package(output, ODP_MIMETYPE, ODP_STYLES) as zf, zf.open("content.xml", "w") as content:
+        buf = bytearray(ODP_CONTENT_START)
+        for page_number, texts in enumerate(slide_texts, start=1):
+            buf += PAGE_START % page_number
+            for text in texts:
+                buf += FRAME_START
+                write_paragraph(buf, text)
+                buf += FRAME_END
+            buf += PAGE_END
+            if len(buf) >= FLUSH_SIZE:
+                content.write(buf)
+                buf.clear()
+        buf += ODP_CONTENT_END
+        content.write(buf)
+
+
+def write_row(buf: bytearray, row: Sequence[Any]) -> None:
+    """Append one spreadsheet row as content.xml bytes, typing each cell by its value."""
+    buf += ROW_START
+    for value in row:
+        if value is None or value == "":
+            buf += EMPTY_CELL
+        elif isinstance(value, str):
+            buf += STRING_CELL_START
+            for line in value.split("\n"):
+                buf += PARAGRAPH_START
+                buf += escape_text(line).encode("utf-8")
+                buf += PARAGRAPH_END
+            buf += CELL_END
+        elif isinstance(value, bool):
+            buf += TRUE_CELL if value else FALSE_CELL
+        elif isinstance(value, float):
+            # Whole numbers are read back as floats by some engines; write them as integers
+            text = (b"%d" % value) if value.is_integer() else repr(value).encode("ascii")
+            buf += FLOAT_CELL % (text, text)
+        elif isinstance(value, numbers.Number):
+            text = str(value).encode("ascii")
+            buf += FLOAT_CELL % (text, text)
+        elif isinstance(value, (datetime.datetime, datetime.date)):
+            text = value.isoformat().encode("ascii")
+            buf += DATE_CELL % (text, text)
+        elif isinstance(value, datetime.time):
+            duration = b"PT%02dH%02dM%02dS" % (value.hour, value.minute, value.second)
+            buf += TIME_CELL % (duration, value.isoformat().encode("ascii"))
+        elif isinstance(value, datetime.timedelta):
+            # Durations (calamine's reading of [h]:mm:ss cells) may run past 24 hours
+            total = int(value.total_seconds())
+            sign = b"-" if total < 0 else b""
+            minutes, second = divmod(abs(total), 60)
+            hours, minute = divmod(minutes, 60)
+            duration = sign + b"PT%02dH%02dM%02dS" % (hours, minute, second)
+            buf += TIME_CELL % (duration, sign + b"%d:%02d:%02d" % (hours, minute, second))
+        else:
+            buf += STRING_CELL_START + PARAGRAPH_START
+            buf += escape_text(str(value)).encode("utf-8")
+            buf += PARAGRAPH_END + CELL_END
+    buf += ROW_END
+
+
+def write_ods(output: BinaryIO, sheets: Iterable[Tuple[str, Iterable[Sequence[Any]]]]) -> None:
+    """Write a spreadsheet, streaming content.xml row by row into the package."""
+    with open_package(output, ODS_MIMETYPE, EMPTY_STYLES) as zf, zf.open("content.xml", "w") as content:
+        buf = bytearray(ODS_CONTENT_START)
+        for sheet_name, rows in sheets:
+            buf += TABLE_START % escape_attribute(sheet_name).encode("utf-8")
+            empty = True
+            for row in rows:
+                empty = False
+                write_row(buf, row)
+                if len(buf) >= FLUSH_SIZE:
+                    content.write(buf)
+                    buf.clear()
+            if empty:
+                # A table must contain at least one row
+                buf += ROW_START + EMPTY_CELL + ROW_END
+            buf += TABLE_END
+        buf += ODS_CONTENT_END
+        content.write(buf)
+
+
+def write_paragraph(buf: bytearray, text: str) -> None:
+    """Append a text paragraph, turning tabs and newlines into ODF elements."""
+    buf += PARAGRAPH_START
+    for line_number, line in enumerate(text.split("\n")):
+        if line_number:
+            buf += LINE_BREAK
+        buf += TAB.join(escape_text(part).encode("utf-8") for part in line.split("\t"))
+    buf += PARAGRAPH_END
+
+
+def write_odt(output: BinaryIO, paragraphs: Iterable[str]) -> None:
+    """Write a text document with one paragraph per string, streaming content.xml."""
+    with open_package(output, ODT_MIMETYPE, EMPTY_STYLES) as zf, zf.open("content.xml", "w") as content:
+        buf = bytearray(ODT_CONTENT_START)
+        for text in paragraphs:
+            write_paragraph(buf, text)
+            if len(buf) >= FLUSH_SIZE:
+                content.write(buf)
+                buf.clear()
+        buf += ODT_CONTENT_END
+        content.write(buf)
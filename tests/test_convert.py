@@ -1,12 +1,34 @@
+import asyncio
+import os
+import socket
+import struct
+import sys
+import time
+import pytest
 from fastapi.testclient import TestClient
+from app import main
 from app.main import app
 from io import BytesIO
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
 from docx import Document
+from docx.enum.text import WD_BREAK
+from docx.oxml import OxmlElement
 import openpyxl
 from pptx import Presentation
+from pyexcel_ods import get_data
+from odf import teletype
+from odf.opendocument import load
+from odf.text import P
 
 client = TestClient(app)
 
+@pytest.fixture(autouse=True)
+def reset_rate_limit():
+    main.rate_limit_storage.clear()
+    main.blocked_until.clear()
+    main.redis_retry_at = 0.0
+
 def create_excel_file():
     wb = openpyxl.Workbook()
     ws = wb.active
@@ -56,6 +78,7 @@ def test_word_conversion():
     response = client.post("/convert/", files=files)
     assert response.status_code == 200
     assert response.headers["Content-Disposition"].endswith(".odt")
+    assert int(response.headers["X-Rate-Limit-Reset"]) > time.time()
     assert response.headers.get("X-Conversion-Status") == "success"
 
 def test_libre_doc_conversion():
@@ -74,3 +97,406 @@ def test_unsupported_file():
     assert response.status_code == 400
     assert response.json() == {"error": "Unsupported file format"}
 
+
+def test_excel_conversion_keeps_all_sheets():
+    wb = openpyxl.Workbook()
+    wb.active.append(["Name", None, "Age"])
+    wb.create_sheet("Second").append(["Carol", 41])
+    stream = BytesIO()
+    wb.save(stream)
+    stream.seek(0)
+    files = {"file": ("multi.xlsx", stream, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")}
+    response = client.post("/convert/", files=files)
+    assert response.status_code == 200
+    data = get_data(BytesIO(response.content), file_type="ods")
+    assert list(data) == ["Sheet", "Second"]
+    assert data["Second"] == [["Carol", 41]]
+
+def test_powerpoint_conversion():
+    files = {"file": ("test.pptx", create_ppt_file(), "application/vnd.openxmlformats-officedocument.presentationml.presentation")}
+    response = client.post("/convert/", files=files)
+    assert response.status_code == 200
+    assert response.headers["Content-Disposition"].endswith(".odp")
+    assert b"<text:p>Title</text:p>" in load(BytesIO(response.content)).xml()
+
+def test_powerpoint_soft_line_breaks_kept():
+    prs = Presentation()
+    slide = prs.slides.add_slide(prs.slide_layouts[1])
+    slide.shapes.title.text = "Hello\vWorld"
+    stream = BytesIO()
+    prs.save(stream)
+    stream.seek(0)
+    files = {"file": ("breaks.pptx", stream, "application/vnd.openxmlformats-officedocument.presentationml.presentation")}
+    response = client.post("/convert/", files=files)
+    assert response.status_code == 200
+    assert b"<text:p>Hello<text:line-break/>World</text:p>" in load(BytesIO(response.content)).xml()
+
+def test_word_paragraph_text_matches_python_docx():
+    doc = Document()
+    run = doc.add_paragraph("Jean").add_run()
+    run._r.append(OxmlElement("w:noBreakHyphen"))
+    run.add_text("Paul")
+    paragraph = doc.add_paragraph("Before")
+    paragraph.add_run().add_break(WD_BREAK.PAGE)
+    paragraph.add_run("After\tend").add_break()
+    paragraph.add_run()._r.append(OxmlElement("w:ptab"))
+    stream = BytesIO()
+    doc.save(stream)
+    expected = [p.text for p in Document(BytesIO(stream.getvalue())).paragraphs]
+    assert expected == ["Jean-Paul", "BeforeAfter\tend\n\t"]
+    stream.seek(0)
+    files = {"file": ("breaks.docx", stream, "application/vnd.openxmlformats-officedocument.wordprocessingml.document")}
+    response = client.post("/convert/", files=files)
+    assert response.status_code == 200
+    odt = load(BytesIO(response.content))
+    assert [teletype.extractText(p) for p in odt.getElementsByType(P)] == expected
+
+def test_rate_limit_blocks_until_window_expires(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(main.time, "monotonic", lambda: now[0])
+    for _ in range(main.RATE_LIMIT_REQUESTS):
+        assert main.check_rate_limit("203.0.113.7")
+    assert not main.check_rate_limit("203.0.113.7")
+    now[0] += main.RATE_LIMIT_WINDOW
+    assert main.check_rate_limit("203.0.113.7")
+
+def test_empty_file():
+    files = {"file": ("empty.docx", BytesIO(b""), "application/vnd.openxmlformats-officedocument.wordprocessingml.document")}
+    response = client.post("/convert/", files=files)
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Uploaded file is empty"}
+
+def test_oversized_upload_rejected(monkeypatch):
+    monkeypatch.setattr(main, "MAX_UPLOAD_BYTES", 1024)
+    files = {"file": ("big.docx", BytesIO(b"x" * 2048), "application/vnd.openxmlformats-officedocument.wordprocessingml.document")}
+    response = client.post("/convert/", files=files)
+    assert response.status_code == 413
+
+def test_zip_bomb_rejected(monkeypatch):
+    monkeypatch.setattr(main, "MAX_UNCOMPRESSED_SIZE", 1024)
+    stream = BytesIO()
+    with zipfile.ZipFile(stream, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("word/document.xml", b"\0" * 4096)
+    stream.seek(0)
+    files = {"file": ("bomb.docx", stream, "application/vnd.openxmlformats-officedocument.wordprocessingml.document")}
+    response = client.post("/convert/", files=files)
+    assert response.status_code == 413
+
+def test_zip_bomb_with_forged_sizes_rejected(monkeypatch):
+    monkeypatch.setattr(main, "MAX_UNCOMPRESSED_SIZE", 1024)
+    stream = BytesIO()
+    with zipfile.ZipFile(stream, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("xl/workbook.xml", b"\0" * 4096)
+    # Declare 10 bytes in both the local header and the central directory
+    data = bytearray(stream.getvalue())
+    struct.pack_into("<I", data, 22, 10)
+    struct.pack_into("<I", data, data.index(b"PK\x01\x02") + 24, 10)
+    with zipfile.ZipFile(BytesIO(bytes(data))) as zf:
+        assert zf.infolist()[0].file_size == 10
+    files = {"file": ("bomb.xlsx", BytesIO(bytes(data)), "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")}
+    response = client.post("/convert/", files=files)
+    assert response.status_code == 413
+
+def test_libreoffice_timeout(monkeypatch, tmp_path):
+    soffice = tmp_path / "soffice"
+    soffice.write_text("#!/bin/sh\nexec sleep 5\n")
+    soffice.chmod(0o755)
+    monkeypatch.setattr(main, "SOFFICE_BINARY", str(soffice))
+    monkeypatch.setattr(main, "SOFFICE_TIMEOUT", 0.2)
+    files = {"file": ("test.doc", create_doc_file(), "application/msword")}
+    response = client.post("/convert/", files=files)
+    assert response.status_code == 500
+    assert "timed out" in response.json()["detail"]
+
+def process_alive(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+def test_libreoffice_timeout_kills_spawned_soffice(monkeypatch, tmp_path):
+    # Like the real wrapper, the script leaves the work to a child process
+    soffice = tmp_path / "soffice"
+    soffice.write_text(f'#!/bin/sh\nsleep 30 &\necho $! > {tmp_path}/child\nwait\n')
+    soffice.chmod(0o755)
+    monkeypatch.setattr(main, "SOFFICE_BINARY", str(soffice))
+    monkeypatch.setattr(main, "SOFFICE_TIMEOUT", 0.5)
+    input_path = tmp_path / "input.doc"
+    input_path.write_bytes(create_doc_file().getvalue())
+    started = time.monotonic()
+    with pytest.raises(main.HTTPException):
+        asyncio.run(main.run_libreoffice([str(input_path)], "odt", str(tmp_path)))
+    assert time.monotonic() - started < 5
+    child = int((tmp_path / "child").read_text())
+    time.sleep(0.2)
+    assert not process_alive(child)
+
+def test_listener_restarted_after_timeout(monkeypatch, tmp_path):
+    hang = tmp_path / "hang"
+    hang.write_text("#!/bin/sh\nexec sleep 30\n")
+    hang.chmod(0o755)
+    monkeypatch.setattr(main, "SOFFICE_BINARY", str(hang))
+    monkeypatch.setattr(main, "UNOCONV_BINARY", str(hang))
+    monkeypatch.setattr(main, "SOFFICE_TIMEOUT", 0.2)
+    monkeypatch.setattr(main, "soffice_listeners", {})
+    monkeypatch.setattr(main, "SOFFICE_LISTENER_START_TIMEOUT", 0.2)
+    input_path = tmp_path / "input.doc"
+    input_path.write_bytes(create_doc_file().getvalue())
+
+    async def time_out_on_listener():
+        main.free_listener_ports = asyncio.Queue()
+        await main.spawn_soffice_listener(2002)
+        stuck = main.soffice_listeners[2002]
+        main.free_listener_ports.put_nowait(2002)
+        try:
+            with pytest.raises(main.HTTPException):
+                await main.run_libreoffice([str(input_path)], "odt", str(tmp_path))
+            assert stuck.returncode is not None
+            assert main.soffice_listeners[2002] is not stuck
+            assert main.soffice_listeners[2002].returncode is None
+            assert main.free_listener_ports.qsize() == 1
+        finally:
+            await main.stop_soffice_listeners()
+            main.free_listener_ports = None
+
+    asyncio.run(time_out_on_listener())
+
+def test_listener_spawn_waits_until_port_accepts(monkeypatch, tmp_path):
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    # Like soffice, only starts accepting a while after the process is up
+    soffice = tmp_path / "soffice"
+    soffice.write_text(
+        f"#!{sys.executable}\n"
+        "import socket, time\n"
+        "time.sleep(0.5)\n"
+        f"server = socket.create_server(('127.0.0.1', {port}))\n"
+        "while True:\n"
+        "    server.accept()[0].close()\n"
+    )
+    soffice.chmod(0o755)
+    monkeypatch.setattr(main, "SOFFICE_BINARY", str(soffice))
+    monkeypatch.setattr(main, "soffice_listeners", {})
+
+    async def spawn_and_connect():
+        try:
+            await main.spawn_soffice_listener(port)
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+        finally:
+            await main.stop_soffice_listeners()
+
+    asyncio.run(spawn_and_connect())
+
+def test_repeated_conversion_served_from_cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(main, "CACHE_DIR", str(tmp_path))
+    content = create_word_file().getvalue()
+    responses = [
+        client.post("/convert/", files={"file": ("test.docx", BytesIO(content), "application/octet-stream")})
+        for _ in range(2)
+    ]
+    assert [r.headers["X-Cache"] for r in responses] == ["MISS", "HIT"]
+    assert responses[0].content == responses[1].content
+    assert len(list(tmp_path.iterdir())) == 1
+
+def test_rate_limit_falls_back_when_redis_unreachable(monkeypatch):
+    script = main.Redis.from_url("redis://127.0.0.1:1").register_script(main.RATE_LIMIT_SCRIPT)
+    monkeypatch.setattr(main, "rate_limit_script", script)
+    remaining, reset = asyncio.run(main.acquire_rate_limit("198.51.100.4"))
+    assert remaining == main.RATE_LIMIT_REQUESTS - 1
+    assert 0 < reset <= main.RATE_LIMIT_WINDOW
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+def test_repeated_conversion_served_from_redis(monkeypatch):
+    fake_redis = FakeRedis()
+    monkeypatch.setattr(main, "redis_client", fake_redis)
+    content = create_word_file().getvalue()
+    responses = [
+        client.post("/convert/", files={"file": ("test.docx", BytesIO(content), "application/octet-stream")})
+        for _ in range(2)
+    ]
+    assert [r.headers["X-Cache"] for r in responses] == ["MISS", "HIT"]
+    assert responses[0].content == responses[1].content
+    assert len(fake_redis.data) == 1
+
+class UnreachableRedis:
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self, *args, **kwargs):
+        self.calls += 1
+        raise main.RedisError("Connection refused")
+
+    get = set = __call__
+
+def test_redis_skipped_after_error(monkeypatch):
+    unreachable = UnreachableRedis()
+    monkeypatch.setattr(main, "redis_client", unreachable)
+    monkeypatch.setattr(main, "rate_limit_script", unreachable)
+    content = create_word_file().getvalue()
+    responses = [
+        client.post("/convert/", files={"file": ("test.docx", BytesIO(content), "application/octet-stream")})
+        for _ in range(2)
+    ]
+    assert [r.status_code for r in responses] == [200, 200]
+    assert unreachable.calls == 1
+
+def test_large_input_converted_in_process_pool(monkeypatch):
+    monkeypatch.setattr(main, "PROCESS_POOL_MIN_INPUT_SIZE", 0)
+    files = {"file": ("test.docx", create_word_file(), "application/vnd.openxmlformats-officedocument.wordprocessingml.document")}
+    response = client.post("/convert/", files=files)
+    assert response.status_code == 200
+    assert response.headers["Content-Disposition"].endswith(".odt")
+
+def crash_converter(input_path, output_path):
+    os._exit(1)
+
+def test_broken_process_pool_retried_on_fresh_pool(monkeypatch, tmp_path):
+    pool = ProcessPoolExecutor(max_workers=1)
+    pool.submit(os._exit, 1)
+    monkeypatch.setattr(main, "PROCESS_POOL", pool)
+    monkeypatch.setattr(main, "PROCESS_POOL_MIN_INPUT_SIZE", 0)
+    input_path = tmp_path / "test.docx"
+    input_path.write_bytes(create_word_file().getvalue())
+    output_path = tmp_path / "test.odt"
+    try:
+        asyncio.run(main.run_converter(main.convert_word_to_odt, str(input_path), str(output_path)))
+        assert output_path.stat().st_size > 0
+        assert main.PROCESS_POOL is not pool
+    finally:
+        main.PROCESS_POOL.shutdown()
+
+def test_input_crashing_workers_fails_without_running_in_process(monkeypatch, tmp_path):
+    monkeypatch.setattr(main, "PROCESS_POOL", ProcessPoolExecutor(max_workers=1, mp_context=main.PROCESS_POOL_CONTEXT))
+    monkeypatch.setattr(main, "PROCESS_POOL_MIN_INPUT_SIZE", 0)
+    input_path = tmp_path / "test.docx"
+    input_path.write_bytes(create_word_file().getvalue())
+    try:
+        with pytest.raises(main.HTTPException) as excinfo:
+            asyncio.run(main.run_converter(crash_converter, str(input_path), str(tmp_path / "test.odt")))
+        assert excinfo.value.status_code == 500
+    finally:
+        main.PROCESS_POOL.shutdown()
+
+def test_forwarded_for_only_trusted_from_proxies(monkeypatch):
+    monkeypatch.setattr(main, "TRUSTED_PROXIES", [main.ipaddress.ip_network("10.0.0.0/8")])
+
+    def client_ip(peer):
+        scope = {"type": "http", "client": (peer, 1234), "headers": [(b"x-forwarded-for", b"1.2.3.4, 203.0.113.7")]}
+        return main.get_client_ip(main.Request(scope))
+
+    assert client_ip("10.1.2.3") == "203.0.113.7"
+    assert client_ip("198.51.100.9") == "198.51.100.9"
+
+def test_batch_conversion(monkeypatch, tmp_path):
+    soffice = tmp_path / "soffice"
+    soffice.write_text(
+        '#!/bin/sh\n'
+        'echo "$@" >> "$(dirname "$0")/calls"\n'
+        'ext=$4; dir=$6; shift 6\n'
+        'for in in "$@"; do base=$(basename "$in"); cp "$in" "$dir/${base%.*}.$ext"; done\n'
+    )
+    soffice.chmod(0o755)
+    monkeypatch.setattr(main, "SOFFICE_BINARY", str(soffice))
+    files = [
+        ("files", ("report.docx", create_word_file(), "application/octet-stream")),
+        ("files", ("old.doc", create_doc_file(), "application/msword")),
+        ("files", ("older.doc", create_doc_file(), "application/msword")),
+    ]
+    response = client.post("/convert-batch/", files=files)
+    assert response.status_code == 200
+    with zipfile.ZipFile(BytesIO(response.content)) as zf:
+        assert sorted(zf.namelist()) == ["old.odt", "older.odt", "report.odt"]
+    # Both .doc files went through a single soffice run
+    assert len((tmp_path / "calls").read_text().splitlines()) == 1
+
+def test_batch_rejects_unsupported_file():
+    files = [
+        ("files", ("report.docx", create_word_file(), "application/octet-stream")),
+        ("files", ("notes.txt", create_unsupported_file(), "text/plain")),
+    ]
+    response = client.post("/convert-batch/", files=files)
+    assert response.status_code == 400
+
+def slot_queue(slots):
+    queue = asyncio.Queue()
+    for slot in range(slots):
+        queue.put_nowait(slot)
+    return queue
+
+def test_soffice_runs_limited_by_slots(monkeypatch, tmp_path):
+    soffice = tmp_path / "soffice"
+    soffice.write_text(
+        '#!/bin/sh\n'
+        'lock="$(dirname "$0")/running"\n'
+        '[ -e "$lock" ] && exit 1\n'
+        'touch "$lock"; sleep 0.2; rm "$lock"\n'
+        'ext=$4; dir=$6; in=$7; base=$(basename "$in"); cp "$in" "$dir/${base%.*}.$ext"\n'
+    )
+    soffice.chmod(0o755)
+    monkeypatch.setattr(main, "SOFFICE_BINARY", str(soffice))
+    monkeypatch.setattr(main, "free_soffice_slots", slot_queue(1))
+    inputs = []
+    for name in ("a", "b"):
+        work_dir = tmp_path / name
+        work_dir.mkdir()
+        input_path = work_dir / "input.doc"
+        input_path.write_bytes(create_doc_file().getvalue())
+        inputs.append((str(input_path), str(work_dir)))
+
+    async def convert_both():
+        return await asyncio.gather(*(main.run_libreoffice([path], "odt", work_dir) for path, work_dir in inputs))
+
+    outputs = asyncio.run(convert_both())
+    assert all(os.path.exists(paths[0]) for paths in outputs)
+
+def test_concurrent_soffice_runs_use_separate_profiles(monkeypatch, tmp_path):
+    # Both runs must be in flight at once: each waits for the other to start
+    soffice = tmp_path / "soffice"
+    soffice.write_text(
+        '#!/bin/sh\n'
+        'dir=$6; echo "$1" > "$dir/profile"; touch "$dir/started"\n'
+        'for i in $(seq 50); do [ "$(ls {tmp}/*/started | wc -l)" -ge 2 ] && break; sleep 0.1; done\n'
+        'ext=$4; in=$7; base=$(basename "$in"); cp "$in" "$dir/${{base%.*}}.$ext"\n'.format(tmp=tmp_path)
+    )
+    soffice.chmod(0o755)
+    monkeypatch.setattr(main, "SOFFICE_BINARY", str(soffice))
+    monkeypatch.setattr(main, "free_soffice_slots", slot_queue(2))
+    inputs = []
+    for name in ("a", "b"):
+        work_dir = tmp_path / name
+        work_dir.mkdir()
+        input_path = work_dir / "input.doc"
+        input_path.write_bytes(create_doc_file().getvalue())
+        inputs.append((str(input_path), str(work_dir)))
+
+    async def convert_both():
+        return await asyncio.gather(*(main.run_libreoffice([path], "odt", work_dir) for path, work_dir in inputs))
+
+    started = time.monotonic()
+    asyncio.run(convert_both())
+    assert time.monotonic() - started < 4
+    profiles = {(tmp_path / name / "profile").read_text().strip() for name in ("a", "b")}
+    assert len(profiles) == 2
+    assert all(profile.startswith("-env:UserInstallation=file://") for profile in profiles)
+
+def test_batch_over_remaining_quota_uses_none_of_it():
+    for _ in range(main.RATE_LIMIT_REQUESTS - 2):
+        assert main.check_rate_limit("testclient")
+    files = [("files", (f"report{i}.docx", create_word_file(), "application/octet-stream")) for i in range(3)]
+    assert client.post("/convert-batch/", files=files).status_code == 429
+    files = {"file": ("test.docx", create_word_file(), "application/octet-stream")}
+    response = client.post("/convert/", files=files)
+    assert response.status_code == 200
+    assert response.headers["X-Rate-Limit-Remaining"] == "1"
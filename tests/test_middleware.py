@@ -0,0 +1,30 @@
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from fastapi.testclient import TestClient
+from app.middleware import BodySizeLimitMiddleware
+
+async def echo_length(request: Request):
+    body = await request.body()
+    return PlainTextResponse(str(len(body)))
+
+app = Starlette(routes=[Route("/", echo_length, methods=["POST"])])
+app.add_middleware(BodySizeLimitMiddleware, max_body_size=1024)
+client = TestClient(app)
+
+def test_body_within_limit_passes():
+    response = client.post("/", content=b"x" * 1024)
+    assert response.status_code == 200
+    assert response.text == "1024"
+
+def test_declared_length_over_limit_rejected():
+    response = client.post("/", content=b"x" * 2048)
+    assert response.status_code == 413
+
+def test_streamed_body_over_limit_rejected():
+    def chunks():
+        for _ in range(4):
+            yield b"x" * 512
+    response = client.post("/", content=chunks())
+    assert response.status_code == 413
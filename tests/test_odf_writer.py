@@ -0,0 +1,38 @@
+from io import BytesIO
+import datetime
+import zipfile
+from pyexcel_ods import get_data
+from odf import teletype, text
+from odf.opendocument import load
+from app.odf_writer import write_ods, write_odt, ODS_MIMETYPE
+
+def test_ods_package_layout():
+    stream = BytesIO()
+    write_ods(stream, [("Sheet1", [["a", 1]])])
+    with zipfile.ZipFile(stream) as zf:
+        first = zf.infolist()[0]
+        assert first.filename == "mimetype"
+        assert first.compress_type == zipfile.ZIP_STORED
+        assert zf.read("mimetype").decode() == ODS_MIMETYPE
+        # The XML parts are what the response size is made of
+        assert zf.getinfo("content.xml").compress_type == zipfile.ZIP_DEFLATED
+
+def test_ods_cell_types_round_trip():
+    row = ["A & <b>", 3, 2.5, True, None, "two\nlines", datetime.date(2024, 1, 31), datetime.timedelta(hours=30)]
+    stream = BytesIO()
+    write_ods(stream, [("Data", iter([row])), ("Blank", iter([]))])
+    stream.seek(0)
+    data = get_data(stream, file_type="ods")
+    assert data["Data"] == [
+        ["A & <b>", 3, 2.5, True, "", "two\nlines", datetime.date(2024, 1, 31), datetime.timedelta(hours=30)]
+    ]
+    assert b'office:time-value="PT30H00M00S"' in zipfile.ZipFile(stream).read("content.xml")
+    assert "Blank" in data
+
+def test_odt_paragraphs_round_trip():
+    stream = BytesIO()
+    write_odt(stream, ["Tom & <Jerry>", "a\tb", "first\nsecond"])
+    stream.seek(0)
+    doc = load(stream)
+    paragraphs = [teletype.extractText(p) for p in doc.getElementsByType(text.P)]
+    assert paragraphs == ["Tom & <Jerry>", "a\tb", "first\nsecond"]